@@ -1,21 +1,33 @@
 # app.py (Vercel 호환성 강화 버전)
 from __future__ import annotations
 
+import math
 import os
+import re
 from dotenv import load_dotenv 
 from pathlib import Path # 경로 처리를 위해 추가
 
 # .env 파일을 읽어 환경 변수를 로드합니다. (로컬 실행 시 필요)
 load_dotenv() 
 
+import hashlib
 import secrets
-from collections import deque
+import threading
+import time
+from collections import Counter, OrderedDict, deque
 from datetime import datetime, timezone, timedelta
-from typing import Any, Deque, Dict, Optional
+from typing import Any, Deque, Dict, Optional, Tuple
 import atexit 
 
+import orjson
 from flask import Flask, abort, jsonify, render_template, request, url_for
+from flask_compress import Compress
 from flask_sqlalchemy import SQLAlchemy 
+from sqlalchemy import bindparam, delete, event, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import load_only, raiseload
+from sqlalchemy.pool import NullPool
 from apscheduler.schedulers.background import BackgroundScheduler 
 
 # ----------------------------------------------------
@@ -23,7 +35,8 @@ from apscheduler.schedulers.background import BackgroundScheduler
 # ----------------------------------------------------
 
 # Vercel 환경 감지 및 DB 경로 설정 수정
-if os.getenv('VERCEL') == '1' or os.getenv('VERCEL_ENV'):
+IS_VERCEL = os.getenv('VERCEL') == '1' or bool(os.getenv('VERCEL_ENV'))
+if IS_VERCEL:
     # Vercel 환경: 쓰기가 가능한 /tmp 디렉토리에 DB 파일을 생성
     DB_FILE_PATH = Path('/tmp') / 'site.db'
     DATABASE_URL = f"sqlite:///{DB_FILE_PATH}"
@@ -35,6 +48,20 @@ else:
 ADMIN_KEY = os.environ.get("ADMIN_KEY", "changeme")
 MAX_HISTORY = int(os.environ.get("MAX_HISTORY", 1000)) 
 MAX_SESSION_LIFETIME_HOURS = int(os.environ.get("MAX_SESSION_LIFETIME_HOURS", 8760000))  # 기본값: 1000년 (365일 * 1000년 = 365000일 = 8760000시간)
+SESSION_LIFETIME = timedelta(hours=MAX_SESSION_LIFETIME_HOURS)
+KST_OFFSET = timedelta(hours=9)  # 화면 표시용 한국 시간(UTC+9)
+# 위치 기록 일괄 저장 설정: 버퍼가 HISTORY_BATCH_SIZE건에 도달하거나 HISTORY_FLUSH_INTERVAL_MS마다 한 번에 커밋
+HISTORY_BATCH_SIZE = int(os.environ.get("HISTORY_BATCH_SIZE", 200))
+HISTORY_FLUSH_INTERVAL_MS = int(os.environ.get("HISTORY_FLUSH_INTERVAL_MS", 100))
+# MAX_HISTORY를 이만큼 넘었을 때 한 번에 정리 (매 저장마다 오래된 기록 삭제 쿼리를 실행하지 않기 위함)
+HISTORY_PRUNE_SLACK = int(os.environ.get("HISTORY_PRUNE_SLACK", 50))
+# 토큰 → 세션 id 캐시 크기/유지 시간 (다른 워커에서 삭제된 세션이 오래 남지 않도록 TTL 적용)
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("TOKEN_CACHE_TTL_SECONDS", 300))
+# 위치 조회 응답 캐시 유지 시간 (같은 프로세스의 위치 저장 시에는 즉시 무효화)
+LATEST_CACHE_TTL_MS = int(os.environ.get("LATEST_CACHE_TTL_MS", 1500))
+# 세션 일괄 생성 API에서 한 번에 만들 수 있는 최대 세션 수
+MAX_BULK_SESSIONS = 100
 
 
 app = Flask(__name__) 
@@ -42,11 +69,42 @@ app = Flask(__name__)
 # DB 설정
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if IS_VERCEL:
+    # 서버리스: 호출 사이에 유휴 커넥션을 들고 있지 않도록 풀을 사용하지 않음
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': NullPool}
+elif not DATABASE_URL.startswith("sqlite"):
+    # 상시 실행 서버(MySQL 등): 커넥션을 재사용하고, 끊긴 커넥션은 사용 전에 감지
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get("DB_POOL_SIZE", 20)),
+        'max_overflow': int(os.environ.get("DB_MAX_OVERFLOW", 40)),
+        'pool_timeout': int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
 db = SQLAlchemy(app) 
 
+# 응답 압축: 기록 API처럼 반복되는 숫자/시각 필드가 많은 JSON 응답의 전송량 감소
+# (COMPRESS_MIN_SIZE 미만인 위치 조회 응답은 압축하지 않으므로 ETag/304 처리에 영향 없음)
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html']
+Compress(app)
+
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(Engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, _connection_record):
+        # WAL 모드: 위치 기록 쓰기 중에도 위치 조회(GET)가 막히지 않도록 하고, 커밋당 fsync 비용을 줄임
+        # (Vercel의 임시 /tmp 파일시스템에서는 WAL의 -wal/-shm 파일을 만들지 않도록 기본 저널 모드 유지)
+        cursor = dbapi_conn.cursor()
+        if not IS_VERCEL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.close()
+
 
 # ----------------------------------------------------
-# 📚 데이터베이스 모델 정의 (변경 없음)
+# 📚 데이터베이스 모델 정의
 # ----------------------------------------------------
 
 # UTC 시간을 DB에 저장할 때 사용
@@ -65,7 +123,14 @@ class Session(db.Model):
     latest_heading = db.Column(db.Float)
     latest_speed = db.Column(db.Float)
     latest_captured_at = db.Column(db.DateTime) 
-    history = db.relationship('LocationHistory', backref='session', lazy='dynamic', cascade="all, delete-orphan")
+    # 위치 조회 API 응답을 저장 시점에 미리 직렬화해 보관 (조회마다 dict 생성/isoformat/JSON 직렬화 생략)
+    latest_json = db.Column(db.Text)
+    # 위치 기록 수를 캐싱 (매 요청마다 COUNT(*)를 실행하지 않기 위함)
+    history_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    history = db.relationship('LocationHistory', backref='session', cascade="all, delete-orphan", order_by='LocationHistory.captured_at.desc()')
+
+    # 관리자 목록 정렬(created_at DESC)과 만료 세션 정리(created_at < 기준)가 인덱스를 사용하도록 함
+    __table_args__ = (db.Index('ix_sessions_created_at', 'created_at'),)
 
     def __repr__(self):
         return f'<Session {self.token}>'
@@ -81,54 +146,351 @@ class LocationHistory(db.Model):
     speed = db.Column(db.Float)
     captured_at = db.Column(db.DateTime, default=now_utc) 
 
+    # 세션별 시간순 조회/오래된 기록 삭제가 인덱스 범위 스캔이 되도록 복합 인덱스 추가
+    __table_args__ = (db.Index('ix_loc_sess_captured', 'session_id', 'captured_at'),)
+
     def __repr__(self):
         return f'<Location {self.session_id} at {self.captured_at}>'
 
 
 # ----------------------------------------------------
-# 🚀 애플리케이션 시작 시 DB 파일 및 테이블 생성
+# 🚀 첫 요청 시 DB 파일 및 테이블 생성 (import 시점에는 DB에 접근하지 않음)
 # ----------------------------------------------------
 
-with app.app_context():
-    # Vercel에서 /tmp 경로를 사용하더라도 테이블이 확실히 생성되도록 보장
-    db.create_all() 
-    print("데이터베이스 초기화 완료 (site.db)")
+def _upgrade_schema(inspector):
+    """create_all()은 기존 테이블에 컬럼/인덱스를 추가하지 않으므로, 모델에 새로 추가된 항목을 직접 추가"""
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(db.text(ddl))
+                print(f"INFO: {table.name}.{column.name} 컬럼 추가")
+                if (table.name, column.name) == ("sessions", "history_count"):
+                    # 기존 세션의 기록 수를 한 번만 채워 넣음 (이후에는 update_location에서 갱신)
+                    conn.execute(db.text(
+                        "UPDATE sessions SET history_count = "
+                        "(SELECT COUNT(*) FROM location_history WHERE location_history.session_id = sessions.id)"
+                    ))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def _ensure_schema():
+    """프로세스당 한 번만 테이블/컬럼/인덱스를 준비 (Vercel 콜드 스타트나 flask CLI 실행 시 import만으로 DDL을 실행하지 않도록)"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with app.app_context():
+            inspector = db.inspect(db.engine)
+            # 테이블 목록을 한 번에 조회해서, 모두 있으면 create_all()의 테이블별 확인을 생략
+            if not {t.name for t in db.metadata.sorted_tables} <= set(inspector.get_table_names()):
+                # Vercel에서 /tmp 경로를 사용하더라도 테이블이 확실히 생성되도록 보장
+                db.create_all() 
+                inspector = db.inspect(db.engine)
+            _upgrade_schema(inspector)
+            print("데이터베이스 초기화 완료 (site.db)")
+        _schema_ready = True
+
+@app.before_request
+def _prepare_schema():
+    _ensure_schema()
 
 
 # ----------------------------------------------------
-# 헬퍼 함수, 정리 로직, 스케줄러 (변경 없음)
+# 헬퍼 함수, 정리 로직, 스케줄러
 # ----------------------------------------------------
 
-def _get_session(token: str) -> Session:
-    session = Session.query.filter_by(token=token).first()
+def _json_response(obj: Any, status: int = 200):
+    # 자주 호출되는 API는 표준 json 대신 orjson으로 직렬화
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
+def _latest_payload(lat, lng, accuracy, heading, speed, captured_at: Optional[datetime]) -> Dict[str, Any]:
+    """위치 조회 API(/api/location/<token>)의 응답 본문"""
+    return {
+        "available": True,
+        "location": {
+            "lat": lat,
+            "lng": lng,
+            "accuracy": accuracy,
+            "heading": heading,
+            "speed": speed,
+            "captured_at": captured_at.replace(tzinfo=timezone.utc).isoformat() if captured_at else None,
+        },
+    }
+
+# 토큰 → (만료 시각, ETag, 직렬화된 응답 본문 bytes) 위치 조회 응답 캐시
+_latest_cache: Dict[str, Tuple[float, Optional[str], bytes]] = {}
+_latest_cache_lock = threading.Lock()
+
+def _load_latest(session_id: int) -> Tuple[Optional[str], bytes]:
+    """위치 조회 API의 (ETag, 응답 본문) - 저장 시점에 직렬화해 둔 본문을 그대로 사용 (ORM 객체 생성/JSON 직렬화 생략)"""
+    session = db.session.execute(
+        select(Session.latest_json, Session.latest_lat).where(Session.id == session_id)
+    ).first()
     if session is None:
         abort(404, description="Unknown share token")
-    return session
+    if session.latest_json is not None:
+        # MySQL DATETIME은 초 단위라 같은 초의 위치가 같은 ETag를 갖지 않도록 응답 본문 자체의 해시를 ETag로 사용
+        body = session.latest_json.encode()
+        return hashlib.blake2b(body, digest_size=8).hexdigest(), body
+
+    if session.latest_lat is None:
+        return None, orjson.dumps({"available": False})
+
+    # latest_json 컬럼 추가 이전에 저장된 위치
+    session = db.session.get(Session, session_id)
+    return None, orjson.dumps(_latest_payload(
+        session.latest_lat, session.latest_lng, session.latest_accuracy,
+        session.latest_heading, session.latest_speed, session.latest_captured_at,
+    ))
+
+def _is_expired(created_at: Optional[datetime]) -> bool:
+    # 만료된 세션은 조회 경로에서 바로 404 처리만 하고, 실제 삭제는 cleanup_expired_sessions가 일괄 처리 (읽기 요청에서 쓰기 방지)
+    return created_at is not None and created_at < now_utc() - SESSION_LIFETIME
+
+# 발급 가능한 토큰 형식: token_urlsafe(16)의 22자, 또는 이전에 발급된 token_hex(16)의 32자
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]{22}|[0-9a-f]{32}")
+
+def _check_token_format(token: str):
+    # 형식이 맞지 않는 토큰은 DB를 조회하지 않고 바로 404
+    if not _TOKEN_PATTERN.fullmatch(token):
+        abort(404, description="Unknown share token")
+
+def _get_session_columns(token: str, *cols):
+    """필요한 컬럼만 조회 (전체 Session 객체 생성 생략) - 만료 확인용 created_at은 항상 포함"""
+    _check_token_format(token)
+    row = db.session.execute(select(Session.created_at, *cols).where(Session.token == token)).first()
+    if row is None or _is_expired(row.created_at):
+        abort(404, description="Unknown share token")
+    return row
+
+# 토큰 → (세션 id, 생성 시각, 캐싱 시각) 캐시: 토큰은 바뀌지 않으므로 폴링/수신 경로에서 세션 조회 SELECT를 생략
+# 요청 스레드와 정리 스케줄러가 함께 쓰므로, 읽기는 잠금 없이 조회하고 추가/삭제는 잠금 안에서 제자리 수정
+# 캐싱 시각 순서를 유지하여 가득 차면 가장 오래전에 조회된 토큰부터 버림
+_token_cache: "OrderedDict[str, Tuple[int, datetime, float]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def _get_session_id(token: str) -> int:
+    now = time.monotonic()
+    cached = _token_cache.get(token)
+    if cached is None or now - cached[2] > TOKEN_CACHE_TTL_SECONDS:
+        _check_token_format(token)
+        row = db.session.execute(select(Session.id, Session.created_at).where(Session.token == token)).first()
+        if row is None:
+            abort(404, description="Unknown share token")
+        cached = (row.id, row.created_at, now)
+        with _token_cache_lock:
+            _token_cache[token] = cached
+            # 갱신된 토큰은 맨 뒤로 옮겨서 오래된 항목으로 취급되어 먼저 버려지지 않도록 함
+            _token_cache.move_to_end(token)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    if _is_expired(cached[1]):
+        abort(404, description="Unknown share token")
+    return cached[0]
+
+def _trim_history(session: Session):
+    """최대 기록 수 초과 시 가장 오래된 기록 삭제 (FIFO) - 캐싱된 기록 수로 판단하여 COUNT(*) 생략"""
+    if session.history_count <= MAX_HISTORY + HISTORY_PRUNE_SLACK:
+        return
+    overflow = session.history_count - MAX_HISTORY
+    # ORM 객체를 로드하지 않고 id만 조회 후 한 번의 DELETE로 삭제
+    # (MySQL은 DELETE 대상 테이블의 LIMIT 서브쿼리를 지원하지 않으므로 id 목록을 먼저 조회)
+    oldest_ids = db.session.scalars(
+        select(LocationHistory.id)
+        .where(LocationHistory.session_id == session.id)
+        .order_by(LocationHistory.captured_at.asc())
+        .limit(overflow)
+    ).all()
+    if oldest_ids:
+        db.session.execute(
+            delete(LocationHistory)
+            .where(LocationHistory.id.in_(oldest_ids))
+            .execution_options(synchronize_session=False)
+        )
+        session.history_count -= len(oldest_ids)
+
+
+# 위치 수신 경로에서 사용하는 Core 문장 (ORM 객체 생성/flush 비용 없이 실행)
+_insert_history = LocationHistory.__table__.insert()
+_update_latest = Session.__table__.update().where(Session.__table__.c.id == bindparam("sid"))
+
+# 아직 DB에 저장되지 않은 위치 기록 버퍼 (요청 스레드와 스케줄러 스레드가 함께 사용)
+_pending_history: Deque[Dict[str, Any]] = deque()
+_pending_lock = threading.Lock()
+# 요청 스레드와 스케줄러가 동시에 저장하지 않도록 직렬화
+_flush_lock = threading.Lock()
+
+def _store_history(rows: list):
+    """위치 기록 저장 + 기록 수 갱신 + FIFO 정리를 한 트랜잭션으로 커밋"""
+    # 버퍼에 있는 동안 정리된 세션의 기록은 버림
+    # (SQLite는 외래 키를 검사하지 않으므로, 그대로 저장하면 어떤 정리 작업도 지우지 않는 고아 기록이 남음)
+    session_ids = {row["session_id"] for row in rows}
+    existing = set(db.session.scalars(select(Session.id).where(Session.id.in_(session_ids))))
+    if existing != session_ids:
+        dropped = len(rows)
+        rows = [row for row in rows if row["session_id"] in existing]
+        print(f"INFO: 삭제된 세션의 위치 기록 {dropped - len(rows)}건 저장 생략")
+        if not rows:
+            db.session.commit()
+            return
+    db.session.execute(_insert_history, rows)
+    added = Counter(row["session_id"] for row in rows)
+    # 다른 프로세스(워커)와 동시에 갱신해도 값이 유실되지 않도록 DB에서 증가
+    for session_id, n in added.items():
+        db.session.execute(
+            update(Session)
+            .where(Session.id == session_id)
+            .values(history_count=Session.history_count + n)
+            .execution_options(synchronize_session=False)
+        )
+    for session in Session.query.filter(Session.id.in_(added)):
+        _trim_history(session)
+    db.session.commit()
+
+def _requeue_history(rows: list):
+    # 저장하지 못한 기록을 원래 순서대로 버퍼 앞에 되돌려 두고 다음 저장 때 다시 시도
+    with _pending_lock:
+        _pending_history.extendleft(reversed(rows))
+
+def _flush_history(max_batches: Optional[int] = None, blocking: bool = True):
+    """버퍼에 쌓인 위치 기록을 HISTORY_BATCH_SIZE건씩 트랜잭션으로 묶어 일괄 저장 (요청마다 커밋/fsync 하지 않기 위함)
+
+    max_batches를 주면 그 배치 수만큼만 저장하고, blocking=False면 다른 스레드가 저장 중일 때 기다리지 않고 반환
+    """
+    if not _flush_lock.acquire(blocking=blocking):
+        return
+    try:
+        with app.app_context():
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                batches += 1
+                with _pending_lock:
+                    rows = [_pending_history.popleft() for _ in range(min(HISTORY_BATCH_SIZE, len(_pending_history)))]
+                if not rows:
+                    return
+
+                try:
+                    _store_history(rows)
+                except OperationalError as e:
+                    # DB 연결 끊김/잠금 등 일시적인 오류: 버리지 않고 다음 저장 때 다시 시도
+                    db.session.rollback()
+                    _requeue_history(rows)
+                    print(f"ERROR: 위치 기록 {len(rows)}건 저장 실패 (다음에 다시 시도): {e}")
+                    return
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"ERROR: 위치 기록 {len(rows)}건 일괄 저장 실패, 한 건씩 다시 저장: {e}")
+                    # 일부 기록의 제약 조건 위반 등으로 다른 세션의 기록까지 잃지 않도록 한 건씩 저장
+                    for i, row in enumerate(rows):
+                        try:
+                            _store_history([row])
+                        except OperationalError as e:
+                            db.session.rollback()
+                            _requeue_history(rows[i:])
+                            print(f"ERROR: 위치 기록 {len(rows) - i}건 저장 실패 (다음에 다시 시도): {e}")
+                            return
+                        except Exception as e:
+                            db.session.rollback()
+                            print(f"ERROR: 위치 기록 저장 실패 (session_id={row['session_id']}): {e}")
+    finally:
+        _flush_lock.release()
+
+def _history_rows(session_id: int, since: Optional[int] = None, limit: int = MAX_HISTORY) -> list:
+    """위치 기록을 (id, lat, lng, accuracy, heading, speed, captured_at) 튜플로 반환 (ORM 객체 대신 필요한 컬럼만 조회)
+
+    since가 없으면 최근 기록을 최신순으로, 있으면 id가 since보다 큰 기록을 저장 순서(id 오름차순)로 반환
+    """
+    query = (
+        select(
+            LocationHistory.id, LocationHistory.lat, LocationHistory.lng, LocationHistory.accuracy,
+            LocationHistory.heading, LocationHistory.speed, LocationHistory.captured_at,
+        )
+        .where(LocationHistory.session_id == session_id)
+    )
+    if since is None:
+        query = query.order_by(LocationHistory.captured_at.desc())
+    else:
+        # captured_at은 요청 시각이라 일괄 저장이 늦어진 기록이나 MySQL(초 단위 DATETIME)의 같은 초 기록을
+        # 놓칠 수 있으므로, 저장 순서대로 증가하는 id를 커서로 사용
+        query = query.where(LocationHistory.id > since).order_by(LocationHistory.id.asc())
+    return db.session.execute(query.limit(limit)).all()
+
+def _format_history(rows: list) -> list:
+    return [
+        {
+            'lat': lat,
+            'lng': lng,
+            'accuracy': accuracy,
+            'heading': heading,
+            'speed': speed,
+            'captured_at': (captured_at + KST_OFFSET).strftime('%Y-%m-%d %H:%M:%S') if captured_at else None
+        }
+        for _id, lat, lng, accuracy, heading, speed, captured_at in rows
+    ]
+
+def _format_history_columns(rows: list) -> dict:
+    """필드별 배열(열 단위) 형식 - 행마다 키를 반복하지 않아 응답 크기 감소"""
+    _ids, lats, lngs, accuracies, headings, speeds, captured = zip(*rows) if rows else ((),) * 7
+    return {
+        'lat': list(lats),
+        'lng': list(lngs),
+        'accuracy': list(accuracies),
+        'heading': list(headings),
+        'speed': list(speeds),
+        'captured_at': [(t + KST_OFFSET).strftime('%Y-%m-%d %H:%M:%S') if t else None for t in captured],
+    }
 
 def cleanup_expired_sessions():
+    _ensure_schema()
     with app.app_context():
-        expiration_time = datetime.utcnow() - timedelta(hours=MAX_SESSION_LIFETIME_HOURS)
-        sessions_to_delete = Session.query.filter(Session.created_at < expiration_time).all()
-        
-        count = len(sessions_to_delete)
-        for s in sessions_to_delete:
-            db.session.delete(s)
-        
-        db.session.commit()
+        # 만료 기준 시각은 스윕당 한 번만 계산하고, 비교는 DB에서 수행 (행마다 파싱하지 않음)
+        expiration_time = now_utc() - SESSION_LIFETIME
+        with _token_cache_lock:
+            expired_tokens = [
+                token for token, cached in _token_cache.items()
+                if cached[1] is not None and cached[1] < expiration_time
+            ]
+            for token in expired_tokens:
+                del _token_cache[token]
+        # 세션을 ORM으로 로드해 한 건씩 삭제하지 않고, 기록/세션을 각각 한 번의 DELETE로 삭제
+        # ORM 세션(identity map) 없이 커넥션에서 바로 실행하여 스케줄러 스레드의 파이썬 작업을 최소화
+        expired_ids = select(Session.id).where(Session.created_at < expiration_time)
+        with db.engine.begin() as conn:
+            conn.execute(delete(LocationHistory).where(LocationHistory.session_id.in_(expired_ids)))
+            count = conn.execute(delete(Session).where(Session.created_at < expiration_time)).rowcount
         
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {count}개의 만료된 세션 정리 완료 (기준: {MAX_SESSION_LIFETIME_HOURS}시간)")
+        return count
 
 scheduler = BackgroundScheduler()
 # APScheduler는 Vercel의 서버리스 환경에서는 제대로 작동하지 않을 수 있습니다.
 # Vercel 함수가 주기적으로 실행되는 환경이 아니기 때문입니다.
 # 하지만 로컬 테스트 및 구색을 위해 코드는 유지합니다.
 scheduler.add_job(func=cleanup_expired_sessions, trigger="interval", minutes=30)
+if not IS_VERCEL:
+    # Vercel은 응답 후 프로세스가 멈출 수 있으므로 버퍼링하지 않고 요청 안에서 바로 저장
+    # 이전 저장이 아직 진행 중이면 기다리지 않고 건너뜀 (진행 중인 저장이 버퍼를 비우므로 APScheduler의 중복 실행 경고도 방지)
+    scheduler.add_job(func=_flush_history, kwargs={"blocking": False}, trigger="interval", seconds=HISTORY_FLUSH_INTERVAL_MS / 1000, coalesce=True)
 scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
+# atexit은 역순으로 실행되므로, 스케줄러를 먼저 멈춘 뒤 남은 버퍼를 저장
+atexit.register(_flush_history)
+atexit.register(lambda: scheduler.shutdown() if scheduler.running else None)
 
 
 # ----------------------------------------------------
-# 🗺️ 경로 (Routes) 정의 (데이터 처리 로직 변경 없음)
+# 🗺️ 경로 (Routes) 정의
 # ----------------------------------------------------
 
 @app.get("/")
@@ -137,117 +499,188 @@ def index():
 
 @app.post("/api/session")
 def create_session():
-    token = secrets.token_hex(16) 
-    track_url = url_for("track_page", token=token, _external=True) 
+    # 16바이트(128비트) 난수를 base64url로 인코딩: hex(32자)보다 짧은 22자 토큰으로 인덱스 키 크기 감소
+    token = secrets.token_urlsafe(16) 
+    # 경로가 고정되어 있으므로 url_for로 URL 맵을 찾지 않고 요청의 기본 URL에 바로 이어 붙임
+    base_url = request.url_root
     new_session = Session(token=token)
     db.session.add(new_session)
     db.session.commit()
-    return ( jsonify({"token": token, "share_url": url_for("share_page", token=token, _external=True), "track_url": track_url,}), 201,)
+    return _json_response({"token": token, "share_url": f"{base_url}share/{token}", "track_url": f"{base_url}track/{token}",}, 201)
+
+@app.post("/api/sessions")
+def create_sessions():
+    """세션 일괄 생성 API (?n=<개수>, 최대 MAX_BULK_SESSIONS개) - 한 번의 INSERT(executemany)와 커밋으로 생성"""
+    n = request.args.get("n", "1")
+    try:
+        n = int(n)
+    except ValueError:
+        n = 0
+    if not 1 <= n <= MAX_BULK_SESSIONS:
+        abort(400, description=f"n must be between 1 and {MAX_BULK_SESSIONS}")
+    tokens = [secrets.token_urlsafe(16) for _ in range(n)]
+    db.session.execute(Session.__table__.insert(), [{"token": token} for token in tokens])
+    db.session.commit()
+    base_url = request.url_root
+    return _json_response({"sessions": [
+        {"token": token, "share_url": f"{base_url}share/{token}", "track_url": f"{base_url}track/{token}"}
+        for token in tokens
+    ]}, 201)
 
 
 @app.get("/share/<token>")
 def share_page(token: str):
-    _get_session(token)
+    # 토큰 존재 여부만 확인하면 되므로 세션 전체를 로드하지 않음
+    _get_session_id(token)
     return render_template("share.html", token=token)
 
 
+def _payload_float(payload: dict, key: str) -> Optional[float]:
+    # 버퍼에 잘못된 값이 들어가 일괄 저장이 실패하지 않도록 요청 단계에서 숫자(또는 None)로 변환
+    value = payload.get(key)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        abort(400, description=f"{key} must be a number")
+    if not math.isfinite(value):
+        abort(400, description=f"{key} must be a finite number")
+    return value
+
 @app.post("/api/location/<token>")
 def update_location(token: str):
-    session = _get_session(token)
-    payload = request.get_json(silent=True) or {}
-    lat = payload.get("lat")
-    lng = payload.get("lng")
+    session_id = _get_session_id(token)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = {}
+    lat = _payload_float(payload, "lat")
+    lng = _payload_float(payload, "lng")
 
     if lat is None or lng is None:
         abort(400, description="lat/lng is required")
         
     current_time = now_utc()
     
-    # 1. 새 위치 기록 생성
-    new_location = LocationHistory(
-        session_id=session.id, lat=float(lat), lng=float(lng), accuracy=payload.get("accuracy"), 
-        heading=payload.get("heading"), speed=payload.get("speed"), captured_at=current_time
-    )
-    db.session.add(new_location)
-    
-    # 2. Session 테이블에 최신 위치 정보 캐싱
-    session.latest_lat = new_location.lat
-    session.latest_lng = new_location.lng
-    session.latest_accuracy = new_location.accuracy
-    session.latest_heading = new_location.heading
-    session.latest_speed = new_location.speed
-    session.latest_captured_at = new_location.captured_at
+    new_location = {
+        "session_id": session_id, "lat": lat, "lng": lng, "accuracy": _payload_float(payload, "accuracy"),
+        "heading": _payload_float(payload, "heading"), "speed": _payload_float(payload, "speed"), "captured_at": current_time,
+    }
     
-    # 3. 최대 기록 수 초과 시 가장 오래된 기록 삭제 (FIFO)
-    current_count = session.history.count()
-    if current_count > MAX_HISTORY:
-        oldest_history = session.history.order_by(LocationHistory.captured_at.asc()).first()
-        if oldest_history:
-            db.session.delete(oldest_history)
-
+    # 1. Session 테이블에 최신 위치 정보 캐싱 (조회 요청이 바로 볼 수 있도록 즉시 커밋)
+    db.session.execute(_update_latest, {
+        "sid": session_id,
+        "latest_lat": new_location["lat"],
+        "latest_lng": new_location["lng"],
+        "latest_accuracy": new_location["accuracy"],
+        "latest_heading": new_location["heading"],
+        "latest_speed": new_location["speed"],
+        "latest_captured_at": current_time,
+        "latest_json": orjson.dumps(_latest_payload(
+            new_location["lat"], new_location["lng"], new_location["accuracy"],
+            new_location["heading"], new_location["speed"], current_time,
+        )).decode(),
+    })
     db.session.commit()
-    return jsonify({"status": "ok"})
+    _latest_cache.pop(token, None)
+
+    # 2. 최신 위치가 커밋된 뒤에 기록을 버퍼에 추가 (저장 및 FIFO 정리는 _flush_history에서 일괄 처리)
+    with _pending_lock:
+        _pending_history.append(new_location)
+        pending_count = len(_pending_history)
+
+    if IS_VERCEL:
+        _flush_history()
+        return _json_response({"status": "ok"})
+    if pending_count >= HISTORY_BATCH_SIZE:
+        # 요청 스레드에서는 한 배치만 저장하고, 이미 저장 중이면 그쪽에 맡김 (나머지는 스케줄러가 저장)
+        _flush_history(max_batches=1, blocking=False)
+    # 위치 기록은 아직 버퍼에 있고 곧 일괄 저장됨
+    return _json_response({"status": "accepted"}, 202)
 
 
 @app.get("/api/location/<token>")
 def latest_location(token: str):
-    session = _get_session(token)
-    
-    if session.latest_lat is None:
-        return jsonify({"available": False})
-        
-    latest = {
-        "lat": session.latest_lat,
-        "lng": session.latest_lng,
-        "accuracy": session.latest_accuracy,
-        "heading": session.latest_heading,
-        "speed": session.latest_speed,
-        "captured_at": session.latest_captured_at.replace(tzinfo=timezone.utc).isoformat() if session.latest_captured_at else None,
-    }
-    
-    return jsonify({"available": True, "location": latest})
+    session_id = _get_session_id(token)
+    # 여러 시청자가 같은 토큰을 폴링하므로, 짧은 시간 동안은 DB 조회 없이 캐시된 응답을 사용
+    cached = _latest_cache.get(token)
+    if cached is None or cached[0] < time.monotonic():
+        etag, body = _load_latest(session_id)
+        cached = (time.monotonic() + LATEST_CACHE_TTL_MS / 1000, etag, body)
+        with _latest_cache_lock:
+            if len(_latest_cache) >= TOKEN_CACHE_SIZE:
+                _latest_cache.clear()
+            _latest_cache[token] = cached
+    _, etag, body = cached
+
+    if etag is None:
+        return app.response_class(body, mimetype="application/json")
+    # 위치가 바뀌지 않았으면 본문 없이 304 응답 (응답 본문 해시를 ETag로 사용)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.get("/track/<token>")
 def track_page(token: str):
-    session = _get_session(token)
+    session = _get_session_columns(token, Session.latest_lat, Session.history_count)
     # 세션 정보를 템플릿에 전달
     session_info = {
-        "token": session.token,
-        "created_at": (session.created_at + timedelta(hours=9)).strftime('%Y-%m-%d %H:%M:%S') if session.created_at else None,
+        "token": token,
+        "created_at": (session.created_at + KST_OFFSET).strftime('%Y-%m-%d %H:%M:%S') if session.created_at else None,
         "has_location": session.latest_lat is not None,
-        "count": session.history.count(),
+        "count": min(session.history_count, MAX_HISTORY),
         "max_history": MAX_HISTORY,
     }
     return render_template("track.html", token=token, session_info=session_info)
 
 @app.get("/api/session/<token>/history")
 def get_session_history(token: str):
-    """세션 기록을 가져오는 API"""
-    session = _get_session(token)
-    history_query = session.history.order_by(LocationHistory.captured_at.desc())
+    """세션 기록을 가져오는 API
+
+    ?since=<next_cursor>를 넘기면 그 이후에 저장된 기록만 저장 순서(오래된 순)로 반환하고, ?limit=<n>으로 개수를 제한합니다.
+    limit개를 모두 받았다면 남은 기록이 더 있을 수 있으므로 next_cursor로 다시 요청합니다.
+    ?format=columns를 넘기면 history를 필드별 배열 형식으로 반환합니다.
+    """
+    session = _get_session_columns(token, Session.id, Session.latest_lat)
+    since = request.args.get("since")
+    if since:
+        try:
+            since = int(since)
+        except ValueError:
+            abort(400, description="since must be a next_cursor value")
+    else:
+        since = None
+    limit = min(max(request.args.get("limit", MAX_HISTORY, type=int), 1), MAX_HISTORY)
+
+    rows = _history_rows(session.id, since=since, limit=limit)
+    history = _format_history_columns(rows) if request.args.get("format") == "columns" else _format_history(rows)
+    # 다음 요청에서 since로 넘길 커서: 이번에 받은 기록의 가장 큰 id (새 기록이 없으면 그대로 유지)
+    next_cursor = max(row.id for row in rows) if rows else since
     
-    history = [
-        {
-            'lat': h.lat,
-            'lng': h.lng,
-            'accuracy': h.accuracy,
-            'heading': h.heading,
-            'speed': h.speed,
-            'captured_at': (h.captured_at + timedelta(hours=9)).strftime('%Y-%m-%d %H:%M:%S') if h.captured_at else None
-        }
-        for h in history_query.limit(MAX_HISTORY).all()
-    ]
-    
-    return jsonify({
-        "token": session.token,
+    return _json_response({
+        "token": token,
         "created_at": session.created_at.isoformat() if session.created_at else None,
         "has_location": session.latest_lat is not None,
-        "count": len(history),
-        "history": history
+        "count": len(rows),
+        "history": history,
+        "next_cursor": next_cursor,
     })
 
 
+# Vercel처럼 APScheduler가 동작하지 않는 환경에서는 외부 cron(Vercel Cron은 GET으로 호출)이 이 경로로 정리를 실행
+@app.route("/api/admin/cleanup", methods=["GET", "POST"])
+def admin_cleanup():
+    key = request.args.get("key")
+    if key != ADMIN_KEY:
+        abort(403, description="Forbidden") 
+    return jsonify({"deleted": cleanup_expired_sessions()})
+
+
 @app.get("/admin")
 def admin_sessions():
     key = request.args.get("key")
@@ -255,16 +688,29 @@ def admin_sessions():
         abort(403, description="Forbidden") 
     
     token_filter = request.args.get("token")
-    all_sessions = Session.query.order_by(Session.created_at.desc()).all()
+    # 목록에 표시하는 컬럼만 로드하고, 그 외 컬럼/기록에 접근하면 세션마다 추가 쿼리(N+1) 대신 바로 오류가 나도록 함
+    all_sessions = (
+        Session.query
+        .options(
+            load_only(Session.token, Session.latest_lat, Session.history_count, raiseload=True),
+            raiseload(Session.history),
+        )
+        .order_by(Session.created_at.desc())
+        .all()
+    )
+
+    # URL 접두사는 요청당 한 번만 만들고 토큰만 이어 붙임 (세션마다 url_for 호출 생략)
+    share_prefix = url_for("share_page", token="__T__", _external=True).replace("__T__", "")
+    track_prefix = url_for("track_page", token="__T__", _external=True).replace("__T__", "")
 
     items = []
     for s in all_sessions:
         items.append({
             "token": s.token,
-            "share_url": url_for("share_page", token=s.token, _external=True),
-            "track_url": url_for("track_page", token=s.token, _external=True),
+            "share_url": share_prefix + s.token,
+            "track_url": track_prefix + s.token,
             "has_location": s.latest_lat is not None, 
-            "count": s.history.count(), 
+            "count": min(s.history_count, MAX_HISTORY), 
         })
 
     selected_history = []
@@ -273,19 +719,7 @@ def admin_sessions():
         target_session = Session.query.filter_by(token=token_filter).first()
         if target_session:
             selected_token = token_filter
-            history_query = target_session.history.order_by(LocationHistory.captured_at.desc())
-            
-            selected_history = [
-                {
-                    'lat': h.lat,
-                    'lng': h.lng,
-                    'accuracy': h.accuracy,
-                    'heading': h.heading,
-                    'speed': h.speed,
-                    'captured_at': (h.captured_at + timedelta(hours=9)).strftime('%Y-%m-%d %H:%M:%S')
-                }
-                for h in history_query.limit(MAX_HISTORY).all()
-            ]
+            selected_history = _format_history(_history_rows(target_session.id))
 
     return render_template(
         "admin.html",
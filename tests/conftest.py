@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+# app 모듈은 import 시점에 환경 변수로 DB/관리자 키를 결정하므로 import 전에 테스트용 값으로 설정
+_DB_DIR = tempfile.mkdtemp(prefix="locshare-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_DB_DIR) / 'test.db'}"
+os.environ["ADMIN_KEY"] = "test-admin-key"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _app_environment():
+    # import 시 시작된 스케줄러(주기 저장/정리 작업)를 멈춰 테스트가 직접 호출할 때만 저장되도록 함
+    app_module.scheduler.shutdown(wait=False)
+    yield
+    with app_module.app.app_context():
+        app_module.db.engine.dispose()
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+class QueryCounter:
+    """엔진에서 실행된 SQL 문장을 기록 (N+1 쿼리 회귀 확인용)"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def query_counter():
+    counter = QueryCounter()
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
@@ -0,0 +1,18 @@
+import app as app_module
+
+SESSION_COUNT = 20
+# 세션 목록 1회 + 선택한 토큰 조회 1회 + 선택한 토큰의 기록 1회 (세션 수와 무관해야 함)
+MAX_ADMIN_QUERIES = 3
+
+
+def test_admin_page_query_count_is_bounded(client, query_counter):
+    tokens = [client.post("/api/session").get_json()["token"] for _ in range(SESSION_COUNT)]
+    for i, token in enumerate(tokens):
+        client.post(f"/api/location/{token}", json={"lat": 37.5 + i, "lng": 127.0})
+    app_module._flush_history()
+
+    query_counter.statements.clear()
+    response = client.get(f"/admin?key={app_module.ADMIN_KEY}&token={tokens[0]}")
+
+    assert response.status_code == 200
+    assert query_counter.count <= MAX_ADMIN_QUERIES, query_counter.statements